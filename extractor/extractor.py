@@ -1,26 +1,47 @@
 import sys
 import re
 import argparse
-import xml.etree.cElementTree as ET
+import itertools
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 
 # global command line arguments
 CLIARGS = None
 
+# literal chars / literal strings, stripped from lines before counting braces.
+_CHAR_LITERAL_RE = re.compile(r'\'(.)*\'', re.M | re.I)
+_STR_LITERAL_RE  = re.compile(r'\"(\\.|[^"])*\"', re.M | re.I)
+
+# statements we look for in the source, group 1 is everything on the right-hand side of the keyword.
+_RETURN_RE = re.compile(r'\breturn\b\s*(.*)')
+_GOTO_RE   = re.compile(r'\bgoto\b\s*(\S+)')
+_EXTERN_RE = re.compile(r'\bextern\b\s*(.*)')
+
 # Class containing lines of code that we will be operating on, as well as all data output by llvm.
 class FileInfo:
+    __slots__ = ('funinfo', 'reginfo', 'lines', 'exitlocs', 'vars', 'funrettype', 'funname', 'toplevel')
+
     def __init__(self):
         self.funinfo = None   # starting ending linenumbers of a function
         self.reginfo = None   # starting ending linenumbers of a regioon
-        self.funloc = {} 
-        self.regloc = {}      # actual lines for both region and a function
-        self.prefunc  = []    # lines before the function
-        self.postfunc = []    # lines after  the function 
+        self.lines = []       # all lines of the source file, line n is stored at index n - 1
         self.exitlocs = []    # line numbers corresponding to exiting edges of the region.
         self.vars = []        # variable list
         self.funrettype = ""  # return type of the function
         self.funname = ""     # name of the extracted function
         self.toplevel = False # is the region a function already?
 
+    # lines belonging to the region.
+    def region_lines(self):
+        return self.lines[self.reginfo.start - 1:self.reginfo.end]
+
+    # lines belonging to the function but not to the region.
+    def function_lines(self):
+        return (self.lines[self.funinfo.start - 1:self.reginfo.start - 1] + 
+                self.lines[self.reginfo.end:self.funinfo.end])
+
     # in case if region starts with the same line as the function we are extracting from, 
     # it means that function header is also a part of a region and has to be separated from 
     # function body.
@@ -29,13 +50,11 @@ class FileInfo:
     def try_separate_func_header(self):
         if self.reginfo.start != self.funinfo.start: return
         for i in range(self.reginfo.start, self.reginfo.end + 1):
-            n = self.regloc[i].count('{')
-            if n != 0: 
+            line = self.lines[i - 1]
+            if '{' in line: 
                 #ensure that we don't have anything following the opening brace. 
-                if self.regloc[i].split('{')[1].rstrip(' \n') != '':
+                if line.split('{', 1)[1].rstrip(' \n') != '':
                     raise Exception('Non-empty string after closing brace!')
-                self.funloc[i] = self.regloc[i]
-                del self.regloc[i]
                 self.reginfo.start = i + 1
                 break
         if self.reginfo.start == self.reginfo.end:
@@ -45,45 +64,40 @@ class FileInfo:
     # has it in the rest of the function. Assumes that closing brace is located on its own line.
     # We are only expecting a single brace
     def region_find_closing_brace(self):
-        (numopeningbraces, numclosingbraces) = brace_count(self.regloc)
-        while numclosingbraces < numopeningbraces:
+        imbalance = brace_imbalance(self.region_lines())
+        while imbalance > 0:
             for i in range(self.reginfo.end + 1, self.funinfo.end + 1): 
-                temp = self.funloc[i].lstrip(' \t')
+                temp = self.lines[i - 1].lstrip(' \t')
                 temp = temp.rstrip(' \n')
                 if len(temp) == 0: continue 
 
                 #found an empty line with brace, use this.
                 if temp == '}':
-                    self.regloc[i] = self.funloc[i]
-                    del self.funloc[i] 
                     self.reginfo.end = i
-                    numclosingbraces = numclosingbraces + 1
+                    imbalance = imbalance - 1
                     break
 
                 # If this happens, manually edit XML file and set the correct ending line
                 if len(temp) != 0: 
                     raise Exception('Could not find closing brace!')
 
-        # save brace numbers for function header insertion!
-        self.reginfo.closingbracenum = numclosingbraces
-        self.reginfo.openingbracenum = numopeningbraces 
+        # save brace imbalance for function header insertion!
+        self.reginfo.braceimbalance = imbalance
 
-    # if function is missing closing braces, add the number necessary.
+    # if function is missing closing braces, save the number necessary so that extract can add them.
     # if we are appending the rest of the src to the extracted region, we do not need to do this. 
     def function_add_closing_brace(self):
         if CLI_ARGS.append: return 
 
-        (numopeningbraces, numclosingbraces) = brace_count(self.funloc)
-        while numclosingbraces < numopeningbraces:
-            self.funinfo.end = self.funinfo.end + 1
-            numclosingbraces = numclosingbraces + 1
-            self.funloc[self.funinfo.end] = '}\n'
+        imbalance = brace_imbalance(self.function_lines())
+        if imbalance > 0:
+            self.funinfo.braceimbalance = imbalance
 
     # located possible extern declarations inside the function.
     def region_locate_externs(self):
         stack = []
         for i in range(self.funinfo.start, self.reginfo.start):
-            line = strip_char_string_literals(self.funloc[i])
+            line = strip_char_string_literals(self.lines[i - 1])
             braces = filter(lambda x: x == '}' or x == '{', line)
             for j in braces:
                 if j == '{': stack.append(j);
@@ -92,62 +106,73 @@ class FileInfo:
                         stack.pop();
                     stack.pop()
             
-            line = line.lstrip('\t ')
-            line = line.rstrip('\n; ')
-            (lhs, rhs) = line_contains(line, 'extern')
-            if lhs != None: stack.append((lhs, rhs))
+            line = line.strip('\t \n;')
+            externstmt = match_statement(line, _EXTERN_RE)
+            if externstmt != None: stack.append(('extern', externstmt.group(1)))
         stack = filter(lambda x: x != '{', stack) 
         return (list(set(stack)))
 
 
+    # Builds the whole output in a list and writes it out at once.
     def extract(self):
-        sys.stdout.write('#include <string.h>\n')
-        function = Function(self.funname, self.funrettype)
+        function = Function(self.funname, self.funrettype, self.toplevel)
         for var in self.vars:
             function.add_variable(var)
 
-        for loc in sorted(self.exitlocs):
-            function.check_exit_loc(self.regloc, loc)
+        # rewrite all exiting lines in one pass. Stores done before goto are the same for every exit, 
+        # so they are only generated once.
+        storetail = function.make_store_and_return()
+        rewrites = {}
+        for loc in sorted(set(self.exitlocs)):
+            if not self.reginfo.between(loc):
+                raise Exception('Region exit at line %s is outside of region!' % loc)
+            line = function.check_exit_loc(self.lines[loc - 1], loc, storetail)
+            if line != None: rewrites[loc] = line
+        for loc, line in rewrites.items():
+            self.lines[loc - 1] = line
+
+        out = ['#include <string.h>\n']
 
         # prepend stuff if flag is set
-        for loc in self.prefunc:  
-            sys.stdout.write(loc)
-
-        sys.stdout.write(function.declare_return_type(self.toplevel))
-        sys.stdout.write(function.get_fn_definition(self.toplevel))
-        sys.stdout.write(function.define_return_value(self.toplevel))
-        for num in sorted(self.regloc.keys()):
-            sys.stdout.write(self.regloc[num])
-        sys.stdout.write(function.store_retvals_and_return(self.toplevel))
+        if CLI_ARGS.append:
+            out.extend(self.lines[:self.funinfo.start - 1])
+
+        out.append(function.declare_return_type())
+        out.append(function.get_fn_definition())
+        out.append(function.define_return_value())
+        out.extend(self.region_lines())
+        out.append(function.store_retvals_and_return())
         
         # after inserting function header number of braces will be unbalanced, insert closing 
         # brace if necessary.
-        if self.reginfo.closingbracenum == self.reginfo.openingbracenum: 
-            sys.stdout.write('}\n\n')  
+        if self.reginfo.braceimbalance == 0: 
+            out.append('}\n\n')  
         else: 
-            sys.stdout.write('\n\n')  
+            out.append('\n\n')  
 
-        for i in range(self.funinfo.start, self.reginfo.start):
-            sys.stdout.write(self.funloc[i])
-        sys.stdout.write(function.get_fn_call(self.toplevel))  
-        sys.stdout.write(function.restore_retvals(self.toplevel)) ## if function is not void, restore all variables
-        for i in range(self.reginfo.end + 1, self.funinfo.end + 1):
-            sys.stdout.write(self.funloc[i])
+        out.extend(self.lines[self.funinfo.start - 1:self.reginfo.start - 1])
+        out.append(function.get_fn_call())  
+        out.append(function.restore_retvals()) ## if function is not void, restore all variables
+        out.extend(self.lines[self.reginfo.end:self.funinfo.end])
+        out.append('}\n' * self.funinfo.braceimbalance)
 
         # append the rest of the source if we have to
-        for loc in self.postfunc: 
-            sys.stdout.write(loc)
+        if CLI_ARGS.append:
+            out.extend(self.lines[self.funinfo.end:])
+
+        sys.stdout.write(''.join(out))
 
 
 class LocInfo:
+    __slots__ = ('start', 'end', 'braceimbalance')
+
     def __init__(self, start, end):
         self.start = start
         self.end = end
-        self.closingbracenum = 0
-        self.openingbracenum = 0
+        self.braceimbalance = 0
 
     def between(self, num):
-        return num >= self.start and num <= self.end
+        return self.start <= num <= self.end
 
     @staticmethod
     def create(xml):
@@ -167,6 +192,8 @@ class LocInfo:
 
 #######################################
 class Variable: 
+    __slots__ = ('name', 'type', 'typehasname', 'isfunptr', 'isoutput', 'isstatic', 'isconstq', 'isarrayt')
+
     def __init__(self, name, type):
         self.name = name
         self.type = type
@@ -240,12 +267,12 @@ class Variable:
             raise Exception('Missing variable info');
         
         variable = Variable(name.text, type.text.strip())
-        if typehasname != None: variable.typehasname = bool(typehasname.text)
-        if isoutput != None: variable.isoutput = bool(isoutput.text)
-        if isfunptr != None: variable.isfunptr = bool(isfunptr.text)
-        if isstatic != None: variable.isstatic = bool(isstatic.text)
-        if isconstq != None: variable.isconstq = bool(isconstq.text)
-        if isarrayt != None: variable.isarrayt = bool(isarrayt.text)
+        variable.typehasname = parse_bool(typehasname)
+        variable.isoutput = parse_bool(isoutput)
+        variable.isfunptr = parse_bool(isfunptr)
+        variable.isstatic = parse_bool(isstatic)
+        variable.isconstq = parse_bool(isconstq)
+        variable.isarrayt = parse_bool(isarrayt)
         return variable
 
 # if condition class for possible return / goto statements inside the region that we have to check 
@@ -255,6 +282,8 @@ class RegionExit:
     STMT_RET     = 1
     STMT_RETVOID = 2
 
+    __slots__ = ('flgvar', 'valvar', 'storevar', 'stmt')
+
     def __init__(self, flg, val, storevar, stmt):
         self.flgvar = flg #flag variable. If we return/goto we set this flag to 1 
         self.valvar = val #if we return some value, we store that value in this variable
@@ -288,15 +317,19 @@ class RegionExit:
         return '%s.%s = 1;\n%s' % (struct, self.flgvar.name, val)
 
 class Function:
-    def __init__(self, funname, funrettype):
+    __slots__ = ('inputs', 'outputs', 'special', 'funname', 'funrettype', 'toplevel', 'retvalname', 
+                 'retvaltype', 'exitflagname', 'exitvaluename')
+
+    def __init__(self, funname, funrettype, toplevel):
         self.inputs  = []
         self.outputs = []
         self.special = [] # for return / gotos within region. (see below)
 
         self.funname    = funname     # name of the extracted function
         self.funrettype = funrettype  # return type of the original function
-        self.retvalname = '%s_retval' # name of the structure returned from the extracted function 
-        self.retvaltype = 'struct %s_struct' # type name of the structure returned from extracted function
+        self.toplevel   = toplevel    # is the region a function already? Fixed for the lifetime of Function.
+        self.retvalname = '%s_retval' % (funname)        # name of the structure returned from the extracted function 
+        self.retvaltype = 'struct %s_struct' % (funname) # type name of the structure returned from extracted function
 
         # if extracted function contains return / goto statements, we need to also return same values
         # from caller function. The idea is to use (flag, value) pairs. After extracted function returns, 
@@ -310,189 +343,177 @@ class Function:
         else: self.inputs.append(var)
 
     # get extracted function's return type.
-    def get_self_return_type(self, toplevel):
-        if toplevel: return self.funrettype
-        return self.retvaltype % (self.funname)
-
-    def get_self_retval_name(self):
-        return self.retvalname % (self.funname)
+    def get_self_return_type(self):
+        if self.toplevel: return self.funrettype
+        return self.retvaltype
 
     # replace return / goto statement in the region with setting flag to 1 and setting value to whatever
     # comes on the rhs of the return statement.
     # we expect return/goto statements formatted in a certain way.
-    def check_exit_loc(self, regloc, loc):
-        temp = regloc[loc]
-        temp = temp.lstrip('\t ')
-        temp = temp.rstrip('\n; ')
-        rett = self.get_self_retval_name()
+    # returns the replacement for the line, or None if line is neither return nor goto statement.
+    # storetail is the output of store_retvals_and_return, appended after goto replacements.
+    def check_exit_loc(self, line, loc, storetail):
+        temp = line.strip('\t \n;')
+        rett = self.retvalname
 
 
-        retstmt = line_contains(temp, 'return')
-        if retstmt != (None, None):
+        retstmt = match_statement(temp, _RETURN_RE)
+        if retstmt != None:
             storeinto, storetarget, stmttype = None, None, RegionExit.STMT_RETVOID
             flg = Variable(self.exitflagname  % (self.funname, loc), 'char')
-            if retstmt[1] != None: 
-                storetarget = Variable(retstmt[1], self.funrettype) 
+            if retstmt.group(1) != '': 
+                storetarget = Variable(retstmt.group(1), self.funrettype) 
                 storeinto   = Variable(self.exitvaluename % (self.funname, loc), self.funrettype) 
                 stmttype = RegionExit.STMT_RET
 
             exit = RegionExit(flg, storeinto, storetarget, stmttype)
             self.special.append(exit) 
-            regloc[loc] = '%sreturn %s;\n' % (exit.store(rett), rett)    
-            return
+            return '%sreturn %s;\n' % (exit.store(rett), rett)    
 
         ## TODO 
-        gotostmt = line_contains(temp, 'goto')
-        if gotostmt != (None, None):
+        gotostmt = match_statement(temp, _GOTO_RE)
+        if gotostmt != None:
             storeinto, storetarget, stmttype = None, None, RegionExit.STMT_RETVOID
             flg = Variable(self.exitflagname  % (self.funname, loc), 'char')
             storeinto   = Variable(self.exitvaluename % (self.funname, loc), self.funrettype) 
-            storetarget = Variable(gotostmt[1], self.funrettype) 
+            storetarget = Variable(gotostmt.group(1), self.funrettype) 
             stmttype = RegionExit.STMT_GOTO 
             exit = RegionExit(flg, storeinto, storetarget, stmttype)
             self.special.append(exit) 
-            regloc[loc] = '%s%s' % (exit.store(rett), self.store_retvals_and_return(False))    
+            return '%s%s' % (exit.store(rett), storetail)    
+        return None
 
     ## returns function definition.
-    def get_fn_definition(self, toplevel):
-        args = '' 
-        for var in self.inputs: args = args + var.as_function_argument() + ', '
-        args = args.rstrip(', ') 
-        return ('%s %s(%s) {\n') % (self.get_self_return_type(toplevel), self.funname, args)
+    def get_fn_definition(self):
+        args = ', '.join(var.as_function_argument() for var in self.inputs)
+        return ('%s %s(%s) {\n') % (self.get_self_return_type(), self.funname, args)
 
     # returns correct function call string
     # if the region is toplevel, we do not need to return a structure from the extracted function, 
     # and just returning same type as original function would be sufficient.
-    def get_fn_call(self, toplevel):
-        args = ''
-        for var in self.inputs: args = args + var.name + ', '
-        args = args.rstrip(', ') 
-
-        rett = self.get_self_return_type(toplevel)
-        retn = self.get_self_retval_name()
-        if toplevel and rett == 'void': return '\t%s(%s);\n' % (self.funname, args)
-        if toplevel and rett != 'void': return '\treturn %s(%s);\n' % (self.funname, args)
+    def get_fn_call(self):
+        args = ', '.join(var.name for var in self.inputs)
+
+        rett = self.get_self_return_type()
+        retn = self.retvalname
+        if self.toplevel and rett == 'void': return '\t%s(%s);\n' % (self.funname, args)
+        if self.toplevel and rett != 'void': return '\treturn %s(%s);\n' % (self.funname, args)
         return '%s %s = %s(%s);\n' % (rett, retn, self.funname, args)
 
     # Defines a structure that is returned from extracted function.
     # If region is toplevel, we do not need such structure - return value directly.
     # Const qualified inputs should not be stored in return structure.
-    def declare_return_type(self, toplevel):
-        if toplevel: return ''
+    def declare_return_type(self):
+        if self.toplevel: return ''
 
-        args = '' 
-        for var in self.inputs:  args = args + var.as_struct_member() 
-        for var in self.outputs: args = args + var.as_struct_member()
-        for var in self.special: args = args + var.as_struct_member()
-        type = self.retvaltype % (self.funname)
-        return '%s {\n%s};\n\n' % (type, args)
+        members = itertools.chain(self.inputs, self.outputs, self.special)
+        args = ''.join(var.as_struct_member() for var in members)
+        return '%s {\n%s};\n\n' % (self.retvaltype, args)
 
     # Defines return value in the beginning of the extracted function and sets 
     # special return flags to 0 if those exist
     # If region is toplevel, we do not need this.
-    def define_return_value(self, toplevel):
-        if toplevel: return ''
+    def define_return_value(self):
+        if self.toplevel: return ''
 
-        name = self.retvalname % (self.funname)
-        type = self.retvaltype % (self.funname)
-        out  = '\t%s %s;\n' % (type, name)
-        for var in self.special: out = out + var.initialize(self.get_self_retval_name())
-        return out 
+        out = ''.join(var.initialize(self.retvalname) for var in self.special)
+        return '\t%s %s;\n%s' % (self.retvaltype, self.retvalname, out)
 
 
     # Stores all local variable in return structure before exiting extracted function.
     # Regions with return statements are handled somewhere else...
     # If region is toplevel, we do not need this!
     # const-qualified inputs should not be stored!
-    def store_retvals_and_return(self, toplevel):
-        if toplevel: return ''
-
-        args = ''
-        retn = self.get_self_retval_name()
-        for var in self.inputs:  args = args + var.store(retn)
-        for var in self.outputs: args = args + var.store(retn)
+    def store_retvals_and_return(self):
+        if self.toplevel: return ''
+        return self.make_store_and_return()
+
+    # Stores all local variables in return structure and returns it, regardless of region being toplevel.
+    def make_store_and_return(self):
+        retn = self.retvalname
+        args = ''.join(var.store(retn) for var in itertools.chain(self.inputs, self.outputs))
         return '%sreturn %s;\n' % (args, retn)
 
     # Restores local variables in the caller from the structure returned by
     # extracted function, definining it if necessary. 
     # If region is toplevel, we do not do this!
     # const-qualified inputs should not be restored!
-    def restore_retvals(self, toplevel):
-        if toplevel: return ''
-
-        args = ''
-        retn = self.get_self_retval_name()
-        for var in self.inputs:  args = args + var.restore(retn)
-        for var in self.outputs: args = args + var.declare_and_initialize(retn)
-        for var in self.special: args = args + var.make_conditional_stmt(retn)
-        return args 
+    def restore_retvals(self):
+        if self.toplevel: return ''
+
+        retn = self.retvalname
+        args = [var.restore(retn) for var in self.inputs]
+        args.extend(var.declare_and_initialize(retn) for var in self.outputs)
+        args.extend(var.make_conditional_stmt(retn) for var in self.special)
+        return ''.join(args)
         
-# returns the string if it exists in the string. Also returns everything on the right-hand side of such 
-# string. Useful for goto/return statements. Performs certain assertion checks to ensure the code extracted
-# is formatted appropriately. See above for formatting details.
-def line_contains(line, string):
-    idx = line.find(string) 
-    if idx != -1:
-        if (len(string) == len(line)): return (string, None) # just have return statement, nothing on rhs.
-        lhs = line[:(idx+len(string))].strip(' \n')
-        rhs = line[(idx+len(string)):].strip(' \n;')
-        lhstemp = strip_char_string_literals(lhs)
-        rhstemp = strip_char_string_literals(rhs)
-        # ensure there are no letters around the word. 
-        if (line[idx + len(string)].isalnum()): return (None, None)
-        if not (idx == 0 or not line[idx-1].isalnum()): return (None, None)
-
-        assert(rhstemp.find('}') == -1 and lhstemp.find('{') == -1)
-        assert(rhstemp.find(';') == -1) # must not have anything after return statement
-        assert(lhstemp == string) # must not have anything before the word. 
-        return (string, rhs) 
-    return (None, None)
-
-# counts number of opening / closing braces. Expects loc to be a dictionary of strings.
-def brace_count(loc):
-    numopeningbraces = 0
-    numclosingbraces = 0
-    for line in loc.values():
-        line = strip_char_string_literals(line); 
-        numopeningbraces = numopeningbraces + line.count('{')
-        numclosingbraces = numclosingbraces + line.count('}')
-    return (numopeningbraces, numclosingbraces)
+# searches the line for the statement matched by regex, group 1 of the match is everything on the 
+# right-hand side of the keyword. Useful for goto/return statements. Performs certain assertion checks to 
+# ensure the code extracted is formatted appropriately. See above for formatting details.
+def match_statement(line, regex):
+    match = regex.search(line)
+    if match == None: return None
+    lhstemp = strip_char_string_literals(line[:match.start()])
+    rhstemp = strip_char_string_literals(line[match.start(1):])
+    assert(rhstemp.find('}') == -1 and lhstemp.find('{') == -1)
+    assert(rhstemp.find(';') == -1) # must not have anything after return statement
+    assert(lhstemp.strip(' \t') == '') # must not have anything before the word. 
+    return match
+
+# returns number of opening braces minus number of closing braces. Expects loc to be a list of 
+# strings. Order of lines does not matter.
+# Braces are counted over the whole joined text at once, literals are only stripped (line by line) 
+# if there is a quote somewhere in the text.
+def brace_imbalance(loc):
+    text = ''.join(loc)
+    if '\'' in text or '"' in text:
+        text = ''.join(map(strip_char_string_literals, loc))
+    return text.count('{') - text.count('}')
 
 # remove all literal chars / literal strings from the line.
+# Most lines have no quotes at all, so skip the regex pass for them.
 def strip_char_string_literals(line):
-    ret = re.sub(r'\'(.)*\'', '', line, re.M | re.I)
-    ret = re.sub(r'\"(\\.|[^"])*\"', '', ret, re.M | re.I) 
-    return ret
+    if '\'' not in line and '"' not in line: return line
+    return _STR_LITERAL_RE.sub('', _CHAR_LITERAL_RE.sub('', line))
 
 #Boring parsing stuff
+# Reads boolean flag from XML element. Missing element means flag is not set. 
+def parse_bool(xml):
+    if xml == None or xml.text == None: return False
+    return xml.text.strip().lower() in ('1', 'true', 'yes')
+
 # Read XML file.
+# Only direct children of the root element are handled, each one is removed from the root as soon as 
+# it has been read so that we never keep the whole tree in memory.
 def parse_xml(fileinfo):
-    tree = ET.parse(CLI_ARGS.xml);
-    for child in tree.getroot():
-        if (child.tag == 'funcname'):   fileinfo.funname = child.text
-        if (child.tag == 'funcreturntype'): fileinfo.funrettype = child.text
-        if (child.tag == 'regionexit'): fileinfo.exitlocs.append(int(child.text))
-        if (child.tag == 'region'):     fileinfo.reginfo = LocInfo.create(child)
-        if (child.tag == 'function'):   fileinfo.funinfo = LocInfo.create(child)
-        if (child.tag == 'variable'):   fileinfo.vars.append(Variable.create(child))
-        if (child.tag == 'toplevel'):   fileinfo.toplevel = bool(int(child.text))
-
-# Read original source file into two different dictionaries.
+    depth = 0
+    root = None
+    for event, child in ET.iterparse(CLI_ARGS.xml, events=('start', 'end')):
+        if event == 'start': 
+            if root == None: root = child
+            depth = depth + 1
+            continue
+        depth = depth - 1
+        if depth != 1: continue
+        handler = _XML_HANDLERS.get(child.tag)
+        if handler != None: handler(fileinfo, child)
+        root.remove(child)
+
+_XML_HANDLERS = {
+    'funcname':       lambda fileinfo, child: setattr(fileinfo, 'funname', child.text),
+    'funcreturntype': lambda fileinfo, child: setattr(fileinfo, 'funrettype', child.text),
+    'regionexit':     lambda fileinfo, child: fileinfo.exitlocs.append(int(child.text)),
+    'region':         lambda fileinfo, child: setattr(fileinfo, 'reginfo', LocInfo.create(child)),
+    'function':       lambda fileinfo, child: setattr(fileinfo, 'funinfo', LocInfo.create(child)),
+    'variable':       lambda fileinfo, child: fileinfo.vars.append(Variable.create(child)),
+    'toplevel':       lambda fileinfo, child: setattr(fileinfo, 'toplevel', parse_bool(child)),
+}
+
+# Read original source file. Lines after the function are only needed if we append them to the output.
 def parse_src(fileinfo):
-    f = open(CLI_ARGS.src)
-    line = f.readline()
-    linenum = 1
-    while line != '':
-        if CLI_ARGS.append == True and linenum < fileinfo.funinfo.start: 
-            fileinfo.prefunc.append(line)
-        if CLI_ARGS.append == True and linenum > fileinfo.funinfo.end:
-            fileinfo.postfunc.append(line)
-        if fileinfo.funinfo.between(linenum):
-            if fileinfo.reginfo.between(linenum): fileinfo.regloc[linenum] = line
-            else: fileinfo.funloc[linenum] = line
-        line = f.readline()
-        linenum = linenum + 1
-    f.close()
+    with open(CLI_ARGS.src) as f:
+        if CLI_ARGS.append: fileinfo.lines = f.readlines()
+        else: fileinfo.lines = list(itertools.islice(f, fileinfo.funinfo.end))
 
 def main():
     fileinfo = FileInfo()
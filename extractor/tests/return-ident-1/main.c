@@ -0,0 +1,15 @@
+int return_value(int a) { return a + 1; }
+
+int main() {
+	int a = 12;
+	int return_a = a - 2;
+	if (a == 13) { 
+		return return_value(a); 
+	}
+	else {
+		a = return_value(a); 
+		return return_a + a;
+	}
+
+	return 0;
+}
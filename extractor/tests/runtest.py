@@ -26,6 +26,7 @@ TESTFILES = [
     'array-4/', 'main.c', 'region.txt', 'main_ifend_ifend13.xml',
     'multiline-args/', 'main.c', 'region.txt', 'myfunction_forcond_forend.xml',
     'lit-brace-1/', 'main.c', 'region.txt', 'main_forcond_forend.xml',
+    'return-ident-1/', 'main.c', 'region.txt', 'main_entry_return.xml',
 ]
 
 TEMPFILES = ['.temp/', 'temp.ll', 'extracted.c', 'extracted.out', 'original.out']